@@ -16,10 +16,9 @@ def get_global_averages(data_dir):
             subfields_file = os.path.join(data_dir, item, "top_subfields_all_time.csv")
             if os.path.exists(subfields_file):
                 try:
-                    df = pd.read_csv(subfields_file)
-                    for _, row in df.iterrows():
-                        name = row['name']
-                        count = row['works_count']
+                    df = pd.read_csv(subfields_file, usecols=['name', 'works_count'])
+                    # Plain column lists avoid building a Series per row
+                    for name, count in zip(df['name'].tolist(), df['works_count'].tolist()):
                         global_subfield_volumes[name] = global_subfield_volumes.get(name, 0) + count
                         total_global_works += count
                 except:
@@ -41,75 +40,88 @@ def get_country_stats(country_code, global_volumes, global_total):
         "trends": {}
     }
 
+    # Countries without subfield data are dropped from the output anyway,
+    # so bail out before parsing their top works and yearly files
+    if not os.path.exists(subfields_file):
+        return None
+    try:
+        df = pd.read_csv(subfields_file, usecols=['name', 'works_count'])
+    except Exception as e:
+        print(f"  Warning: subfields error {country_code}: {e}")
+        return None
+    if df.empty:
+        return None
+
     # Helper: Load Top Papers Map
     papers_map = {} # { "Subfield Name": [ {paper1}, {paper2} ] }
     if os.path.exists(top_works_file):
         try:
-            works_df = pd.read_csv(top_works_file)
-            # Group by subfield name
-            for sf_name, group in works_df.groupby('subfield_name'):
-                # Convert top 3 papers to list of dicts
-                papers = group[['title', 'doi', 'year', 'cited_by_count']].fillna('').to_dict('records')
-                papers_map[sf_name] = papers
+            works_df = pd.read_csv(top_works_file, usecols=['subfield_name', 'title', 'doi', 'year', 'cited_by_count'])
+            # Convert all papers to dicts in one pass, then bucket them by subfield name
+            papers = works_df[['title', 'doi', 'year', 'cited_by_count']].fillna('').to_dict('records')
+            for sf_name, paper in zip(works_df['subfield_name'].tolist(), papers):
+                papers_map.setdefault(sf_name, []).append(paper)
         except Exception as e:
             print(f"  Warning: could not read top works for {country_code}: {e}")
 
     # 1. Process Top Subfields & Calculate Uniqueness
     top_names = []
-    if os.path.exists(subfields_file):
-        try:
-            df = pd.read_csv(subfields_file)
-            
-            # A. Basic Top 10 (Volume)
-            top_10 = df.head(10).rename(columns={'name': 'name', 'works_count': 'totalWorks'})
-            top_subfields_list = top_10[['name', 'totalWorks']].to_dict('records')
-
-            # Attach Papers to Top Subfields
-            for item in top_subfields_list:
-                item['topPapers'] = papers_map.get(item['name'], [])
-
-            stats["topSubfields"] = top_subfields_list
-            top_names = top_10['name'].tolist()
-
-            # B. Calculate Uniqueness (RCA Score)
-            country_total_works = df['works_count'].sum()
-            
-            uniqueness_list = []
-            for _, row in df.iterrows():
-                topic_name = row['name']
-                topic_vol = row['works_count']
-                
-                country_share = topic_vol / country_total_works if country_total_works > 0 else 0
-                world_vol = global_volumes.get(topic_name, 0)
-                world_share = world_vol / global_total if global_total > 0 else 1
-                
-                if world_share == 0: world_share = 0.00001
-                score = country_share / world_share
-                
-                uniqueness_list.append({
-                    'name': topic_name,
-                    'totalWorks': topic_vol,
-                    'score': round(score, 2),
-                    # Attach Papers to Unique Subfields too
-                    'topPapers': papers_map.get(topic_name, []) 
-                })
-            
-            uniqueness_list.sort(key=lambda x: x['score'], reverse=True)
-            stats["uniqueSubfields"] = uniqueness_list[:5]
+    try:
+        # A. Basic Top 10 (Volume)
+        top_10 = df.head(10).rename(columns={'name': 'name', 'works_count': 'totalWorks'})
+        top_subfields_list = top_10[['name', 'totalWorks']].to_dict('records')
 
-        except Exception as e:
-            print(f"  Warning: subfields error {country_code}: {e}")
+        # Attach Papers to Top Subfields
+        for item in top_subfields_list:
+            item['topPapers'] = papers_map.get(item['name'], [])
+
+        stats["topSubfields"] = top_subfields_list
+        top_names = top_10['name'].tolist()
+
+        # B. Calculate Uniqueness (RCA Score)
+        country_total_works = df['works_count'].sum()
+
+        # Shares are computed column-wise instead of row by row
+        country_share = df['works_count'] / country_total_works if country_total_works > 0 else 0
+        if global_total > 0:
+            world_share = df['name'].map(global_volumes).fillna(0) / global_total
+        else:
+            world_share = pd.Series(1, index=df.index)
+        world_share = world_share.replace(0, 0.00001)
+        scores = (country_share / world_share).round(2)
+
+        # nlargest keeps the first row on ties, same as a stable descending sort
+        top_unique = scores.nlargest(5).index
+        stats["uniqueSubfields"] = [
+            {
+                'name': topic_name,
+                'totalWorks': topic_vol,
+                'score': score,
+                # Attach Papers to Unique Subfields too
+                'topPapers': papers_map.get(topic_name, [])
+            }
+            for topic_name, topic_vol, score in zip(
+                df.loc[top_unique, 'name'],
+                df.loc[top_unique, 'works_count'].tolist(),
+                scores[top_unique].tolist()
+            )
+        ]
+
+    except Exception as e:
+        print(f"  Warning: subfields error {country_code}: {e}")
 
     # 2. Process Yearly Trends
     if os.path.exists(yearly_subfields_file) and top_names:
         try:
-            df = pd.read_csv(yearly_subfields_file)
+            # Sorted once up front so every subfield's points come out in year order
+            df = pd.read_csv(yearly_subfields_file, usecols=['year', 'name', 'works_count'])
+            df = df.sort_values('year', kind='stable', ignore_index=True)
+            # One walk over the raw columns instead of a slice + to_dict per subfield
+            trends_by_name = {}
+            for name, year, volume in zip(df['name'].tolist(), df['year'].tolist(), df['works_count'].tolist()):
+                trends_by_name.setdefault(name, []).append({'year': year, 'volume': volume})
             for subfield_name in top_names:
-                sf_data = df[df['name'] == subfield_name].sort_values('year')
-                trend_list = sf_data[['year', 'works_count']].rename(columns={
-                    'works_count': 'volume'
-                }).to_dict('records')
-                stats["trends"][subfield_name] = trend_list
+                stats["trends"][subfield_name] = trends_by_name.get(subfield_name, [])
         except Exception as e:
             print(f"  Warning: trends error {country_code}: {e}")
 
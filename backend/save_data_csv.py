@@ -1,4 +1,5 @@
-from pyalex import Topics, Works, config
+import pyalex.api
+from pyalex import Works, config
 from typing import List, Dict, Optional
 import pandas as pd
 from datetime import datetime
@@ -6,6 +7,14 @@ import os
 from dotenv import load_dotenv
 import time
 import random
+import threading
+import heapq
+import hashlib
+import json
+import requests
+from urllib3.util import Retry
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 
 # Load environment variables
 load_dotenv()
@@ -20,17 +29,135 @@ TARGET_COUNTRIES = None
 # How many years back to track for the yearly trends
 YEARS_BACK = 20
 
+# Phases to run per country. Turn these off for quicker runs that only
+# refresh top_subfields_all_time.csv; the existing CSVs are left as they are.
+FETCH_YEARLY_TRENDS = True
+FETCH_TOP_WORKS = True
+
+# Skip countries that a recent run finished, so an interrupted run can be
+# restarted without fetching them again. When every query for a country
+# succeeds, COMPLETE_MARKER is written to its folder listing the phases that
+# ran; a country is skipped only if its marker covers all enabled phases.
+# Markers older than SKIP_EXISTING_MAX_AGE_HOURS are ignored.
+SKIP_EXISTING = False
+SKIP_EXISTING_MAX_AGE_HOURS = 24
+COMPLETE_MARKER = ".complete"
+
 # Max retries for API calls
 MAX_RETRIES = 10
 
+# Parallel OpenAlex requests per batch. The request rate itself is capped
+# by MIN_REQUEST_INTERVAL below, shared across all threads.
+MAX_WORKERS = 5
+
+# Minimum seconds between OpenAlex requests across the whole run, to stay
+# under the polite-pool limit (~10 req/s); safe_get still backs off on 429s.
+MIN_REQUEST_INTERVAL = 0.1
+
+# Successful OpenAlex responses are cached on disk so re-runs skip the network.
+# Set CACHE_DIR to None to always fetch fresh data.
+CACHE_DIR = ".openalex_cache"
+CACHE_TTL_HOURS = 24
+
+# pyalex opens a fresh requests.Session (and TLS handshake) for every .get().
+# One shared session keeps connections to api.openalex.org alive across calls;
+# the pool covers both concurrent phases of process_country. The adapter keeps
+# pyalex's Retry settings, so 429/500/503 still surface as retryable errors.
+_session = requests.Session()
+_session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(
+        max_retries=Retry(
+            total=config.max_retries,
+            backoff_factor=config.retry_backoff_factor,
+            status_forcelist=config.retry_http_codes,
+            allowed_methods={"GET"},
+        ),
+        pool_maxsize=2 * MAX_WORKERS,
+    ),
+)
+pyalex.api._get_requests_session = lambda: _session
+
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+# Queries safe_get gave up on. safe_get returns [] either way, so
+# process_country compares this count to tell a failed query from an empty one.
+_failed_queries = 0
+_failed_lock = threading.Lock()
+
+def record_failed_query():
+    """
+    Counts a query that safe_get gave up on.
+    """
+    global _failed_queries
+    with _failed_lock:
+        _failed_queries += 1
+
+def wait_for_rate_limit():
+    """
+    Blocks until this thread may send its next OpenAlex request.
+    Each caller reserves the next free slot under the lock, then sleeps outside it.
+    """
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        wait_time = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + MIN_REQUEST_INTERVAL
+    if wait_time > 0:
+        time.sleep(wait_time)
+
+def get_cache_path(query_object, kwargs: Dict) -> Optional[str]:
+    """
+    Returns the cache file for a query, keyed by its URL and .get() arguments.
+    """
+    if not CACHE_DIR:
+        return None
+    key = json.dumps([query_object.url, kwargs], sort_keys=True)
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+def read_cache(cache_path: Optional[str]) -> Optional[List[Dict]]:
+    """
+    Returns the cached response if it exists and is younger than CACHE_TTL_HOURS.
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    if time.time() - os.path.getmtime(cache_path) > CACHE_TTL_HOURS * 3600:
+        return None
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_cache(cache_path: Optional[str], results: List[Dict]):
+    """
+    Saves a successful response to the on-disk cache.
+    """
+    if not cache_path:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temp file first so concurrent readers never see a partial file
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f)
+    os.replace(tmp_path, cache_path)
+
 def safe_get(query_object, **kwargs):
     """
     Wraps the pyalex .get() method with a custom retry loop.
     Now accepts **kwargs to pass arguments (like per_page) to .get()
+    Responses are served from the on-disk cache while it is fresh.
     """
+    cache_path = get_cache_path(query_object, kwargs)
+    cached = read_cache(cache_path)
+    if cached is not None:
+        return cached
+
     for attempt in range(MAX_RETRIES):
+        wait_for_rate_limit()
         try:
-            return query_object.get(**kwargs)
+            results = query_object.get(**kwargs)
         except Exception as e:
             error_str = str(e).lower()
             if "429" in error_str or "connection" in error_str:
@@ -38,11 +165,16 @@ def safe_get(query_object, **kwargs):
                 if attempt > 2:
                     print(f"    [!] API Limit Hit (429). Pausing for {wait_time:.1f}s...")
                 time.sleep(wait_time)
-            else:
-                print(f"    [!] Unexpected Error: {e}")
-                return []
+                continue
+            print(f"    [!] Unexpected Error: {e}")
+            record_failed_query()
+            return []
+
+        write_cache(cache_path, results)
+        return results
     
     print(f"    [X] Failed after {MAX_RETRIES} attempts.")
+    record_failed_query()
     return []
 
 def get_active_countries(limit: Optional[int] = None) -> List[Dict]:
@@ -59,10 +191,9 @@ def get_active_countries(limit: Optional[int] = None) -> List[Dict]:
         
         countries = []
         for g in groups:
-            if g.get('key'):
-                raw_key = g['key']
+            if raw_key := g.get('key'):
                 # Clean up key (handle urls like https://openalex.org/US)
-                code = raw_key.split('/')[-1] if 'openalex.org' in raw_key else raw_key
+                code = raw_key.rpartition('/')[2] if 'openalex.org' in raw_key else raw_key
                 
                 # Filter out 'unknown' or invalid codes
                 if code and code.lower() != 'unknown':
@@ -72,11 +203,10 @@ def get_active_countries(limit: Optional[int] = None) -> List[Dict]:
                         'count': g['count']
                     })
         
-        # Sort by volume
-        countries.sort(key=lambda x: x['count'], reverse=True)
-        
+        # Sort by volume (partial selection when only the top few are needed)
         if limit:
-            return countries[:limit]
+            return heapq.nlargest(limit, countries, key=itemgetter('count'))
+        countries.sort(key=itemgetter('count'), reverse=True)
         return countries
         
     except Exception as e:
@@ -96,23 +226,62 @@ def get_top_subfields_all_domains(country_code: str, top_n: int = 10) -> List[Di
         
         grouped = safe_get(query)
         
-        results = []
-        for g in grouped:
-            if g.get('key'):
-                results.append({
-                    'id': g['key'].split('/')[-1],
-                    'name': g['key_display_name'],
-                    'works_count': g['count']
-                })
-        results.sort(key=lambda x: x['works_count'], reverse=True)
-        return results[:top_n]
+        results = [
+            {
+                'id': key.rpartition('/')[2],
+                'name': g['key_display_name'],
+                'works_count': g['count']
+            }
+            for g in grouped if (key := g.get('key'))
+        ]
+        return heapq.nlargest(top_n, results, key=itemgetter('works_count'))
     except Exception as e:
         print(f"  [!] Error fetching top subfields for {country_code}: {e}")
         return []
 
+def fetch_top_works_for_subfield(country_code: str, sf: Dict, start_date: str) -> List[Dict]:
+    """
+    Fetch the top 10 most cited papers for a single subfield since start_date.
+    """
+    sf_id = sf['id']
+    sf_name = sf['name']
+
+    # Query: Filter by Country + Subfield + Date, Sort by Citations
+    query = Works().filter(
+        **{
+            'authorships.institutions.country_code': country_code,
+            'topics.subfield.id': sf_id,
+            'from_publication_date': start_date
+        }
+    ).sort(cited_by_count="desc").select([
+        "id", 
+        "doi", 
+        "title", 
+        "publication_year", 
+        "cited_by_count"
+    ])
+
+    works = safe_get(query, per_page=10)
+
+    top_works = [
+        {
+            'subfield_id': sf_id,
+            'subfield_name': sf_name,
+            'title': w.get('title'),
+            'doi': w.get('doi'),
+            'year': w.get('publication_year'),
+            'cited_by_count': w.get('cited_by_count'),
+            'id': w.get('id')
+        }
+        for w in works
+    ]
+
+    return top_works
+
 def fetch_top_works_for_subfields(country_code: str, subfields: List[Dict], country_dir: str):
     """
-    For each top subfield, fetch the top 3 most cited papers from the last 20 years.
+    For each top subfield, fetch the top 10 most cited papers from the last 20 years.
+    The per-subfield queries are independent, so they run on a small thread pool.
     """
     print(f"    > Fetching Top 10 Papers for {len(subfields)} subfields...")
     
@@ -121,54 +290,105 @@ def fetch_top_works_for_subfields(country_code: str, subfields: List[Dict], coun
     
     all_top_works = []
 
-    for sf in subfields:
-        sf_id = sf['id']
-        sf_name = sf['name']
-
-        # Query: Filter by Country + Subfield + Date, Sort by Citations
-        # REMOVED .per_page(3) from the chain here
-        query = Works().filter(
-            **{
-                'authorships.institutions.country_code': country_code,
-                'topics.subfield.id': sf_id,
-                'from_publication_date': start_date
-            }
-        ).sort(cited_by_count="desc").select([
-            "id", 
-            "doi", 
-            "title", 
-            "publication_year", 
-            "cited_by_count"
-        ])
-
-        # ADDED per_page=3 here
-        works = safe_get(query, per_page=10)
-
-        for w in works:
-            all_top_works.append({
-                'subfield_id': sf_id,
-                'subfield_name': sf_name,
-                'title': w.get('title'),
-                'doi': w.get('doi'),
-                'year': w.get('publication_year'),
-                'cited_by_count': w.get('cited_by_count'),
-                'id': w.get('id')
-            })
-        
-        time.sleep(0.2)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # map() keeps the subfield order, so the CSV rows come out as before
+        results = executor.map(lambda sf: fetch_top_works_for_subfield(country_code, sf, start_date), subfields)
+        for top_works in results:
+            all_top_works.extend(top_works)
 
     if all_top_works:
         df = pd.DataFrame(all_top_works)
         df.to_csv(os.path.join(country_dir, 'top_works.csv'), index=False)
         print(f"    ✓ Saved top papers to {country_dir}/top_works.csv")
 
-def process_country(country_code: str, country_name: str):
+def fetch_yearly_counts_for_subfield(country_code: str, sf: Dict, start_year: int, end_year: int) -> List[Dict]:
+    """
+    Fetch the works count per year for a single subfield between start_year and end_year.
+    """
+    # One year-range query grouped by year replaces a query per year
+    query = Works().filter(
+        **{
+            'authorships.institutions.country_code': country_code,
+            'from_publication_date': f"{start_year}-01-01",
+            'to_publication_date': f"{end_year}-12-31",
+            'topics.subfield.id': sf['id']
+        }
+    ).group_by('publication_year')
+    
+    year_groups = safe_get(query)
+    
+    yearly_data = [
+        {
+            'year': int(key),
+            'id': sf['id'],
+            'name': sf['name'],
+            'works_count': g['count'],
+            'country': country_code
+        }
+        for g in year_groups if (key := g.get('key'))
+    ]
+    return yearly_data
+
+def fetch_yearly_subfields(country_code: str, subfields: List[Dict], country_dir: str, timestamp: str):
+    """
+    Fetch per-year works counts for the given subfields over the last YEARS_BACK years.
+    Each subfield is an independent query, so they are fetched on a thread pool.
+    """
     current_year = datetime.now().year
     start_year = current_year - YEARS_BACK
+
+    all_yearly_data = []
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = executor.map(
+            lambda sf: fetch_yearly_counts_for_subfield(country_code, sf, start_year, current_year),
+            subfields
+        )
+        for yearly_data in results:
+            all_yearly_data.extend(yearly_data)
+
+    # Stable sort by year: rows within a year keep the top-subfield rank order
+    all_yearly_data.sort(key=itemgetter('year'))
+
+    if all_yearly_data:
+        df = pd.DataFrame(all_yearly_data)
+        df['fetch_date'] = timestamp
+        df.to_csv(os.path.join(country_dir, 'yearly_subfields.csv'), index=False)
+
+def get_enabled_phases() -> List[str]:
+    """
+    Names of the per-country phases switched on in the configuration.
+    """
+    phases = []
+    if FETCH_YEARLY_TRENDS:
+        phases.append('yearly_subfields')
+    if FETCH_TOP_WORKS:
+        phases.append('top_works')
+    return phases
+
+def is_country_saved(country_code: str) -> bool:
+    """
+    True if a recent run finished every enabled phase for this country.
+    """
+    marker_path = os.path.join(DATA_DIR, country_code, COMPLETE_MARKER)
+    if not os.path.exists(marker_path):
+        return False
+    if time.time() - os.path.getmtime(marker_path) > SKIP_EXISTING_MAX_AGE_HOURS * 3600:
+        return False
+    with open(marker_path) as f:
+        finished = set(f.read().split())
+    return set(get_enabled_phases()) <= finished
+
+def process_country(country_code: str, country_name: str):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     country_dir = os.path.join(DATA_DIR, country_code)
     os.makedirs(country_dir, exist_ok=True)
+    # Clear the previous run's marker so an interrupted country is never counted as finished
+    marker_path = os.path.join(country_dir, COMPLETE_MARKER)
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+    failures_before = _failed_queries
     
     print(f"\n  > Starting Analysis for {country_name} ({country_code})...")
     
@@ -182,41 +402,26 @@ def process_country(country_code: str, country_name: str):
     # Save Top 10 list
     pd.DataFrame(top_sf_data).to_csv(os.path.join(country_dir, 'top_subfields_all_time.csv'), index=False)
 
-    # 2. Get Yearly Trends for these subfields
-    top_sf_ids = [item['id'] for item in top_sf_data]
-    all_yearly_data = []
-
-    for year in range(start_year, current_year + 1):
-        ids_string = "|".join(top_sf_ids)
-        sf_query = Works().filter(
-            **{
-                'authorships.institutions.country_code': country_code,
-                'publication_year': year,
-                'topics.subfield.id': ids_string
-            }
-        ).group_by('topics.subfield.id')
-        
-        sf_groups = safe_get(sf_query)
-        
-        if sf_groups:
-            for g in sf_groups:
-                if g.get('key'):
-                    all_yearly_data.append({
-                        'year': year,
-                        'id': g['key'].split('/')[-1],
-                        'name': g['key_display_name'],
-                        'works_count': g['count'],
-                        'country': country_code
-                    })
-        time.sleep(0.1)
+    # 2. Yearly Trends and 3. Top 10 Papers per Subfield only depend on the
+    # top subfields, so both network-bound phases run concurrently
+    phases = get_enabled_phases()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = []
+        if 'yearly_subfields' in phases:
+            futures.append(executor.submit(fetch_yearly_subfields, country_code, top_sf_data, country_dir, timestamp))
+        if 'top_works' in phases:
+            futures.append(executor.submit(fetch_top_works_for_subfields, country_code, top_sf_data, country_dir))
+        # result() re-raises any error so main() still reports it per country
+        for future in futures:
+            future.result()
 
-    if all_yearly_data:
-        df = pd.DataFrame(all_yearly_data)
-        df['fetch_date'] = timestamp
-        df.to_csv(os.path.join(country_dir, 'yearly_subfields.csv'), index=False)
+    # Countries run one at a time, so any new failure belongs to this one
+    if _failed_queries != failures_before:
+        print("    x Some queries failed. Not marking as complete.")
+        return
 
-    # 3. Fetch Top 3 Papers per Subfield
-    fetch_top_works_for_subfields(country_code, top_sf_data, country_dir)
+    with open(marker_path, 'w') as f:
+        f.write("\n".join(phases))
 
 def main():
     # 1. Determine which countries to process
@@ -236,6 +441,10 @@ def main():
         
         print(f"\n[{i}/{len(country_list)}] Processing Country: {name} ({code})")
         
+        if SKIP_EXISTING and is_country_saved(code):
+            print("    > Already saved. Skipping.")
+            continue
+        
         try:
             process_country(code, name)
         except KeyboardInterrupt:
@@ -1,5 +1,19 @@
 import { GoogleGenerativeAI } from "@google/generative-ai";
 import { NextResponse } from "next/server";
+import type { SubfieldData } from "@/data/country-data";
+
+// Paper lists dominate the prompt size, so only a few titles per area are sent
+const MAX_PAPERS_PER_AREA = 2;
+
+// Gemini calls still in flight, keyed by country + trimmed question
+const inflightRequests = new Map<string, Promise<string>>();
+
+const summarizeArea = (subfield: SubfieldData) => ({
+  name: subfield.name,
+  totalWorks: subfield.totalWorks,
+  ...(subfield.score !== undefined && { score: subfield.score }),
+  topPapers: (subfield.topPapers ?? []).slice(0, MAX_PAPERS_PER_AREA).map((paper) => paper.title),
+});
 
 export async function POST(req: Request) {
   try {
@@ -16,10 +30,16 @@ export async function POST(req: Request) {
 
     let contextPrompt = "";
     if (countryData) {
+        const topAreas: SubfieldData[] = countryData.topSubfields?.slice(0, 5) ?? [];
+        const seenAreas = new Set(topAreas.map((area) => area.name));
+
+        // Specializations often repeat a top area; send those by name and score only
         const summaryData = {
           country: countryData.countryName,
-          top_areas: countryData.topSubfields?.slice(0, 5), 
-          specializations: countryData.uniqueSubfields?.slice(0, 3),
+          top_areas: topAreas.map(summarizeArea),
+          specializations: (countryData.uniqueSubfields?.slice(0, 3) ?? []).map((area: SubfieldData) =>
+            seenAreas.has(area.name) ? { name: area.name, score: area.score } : summarizeArea(area)
+          ),
         };
         
         contextPrompt = `
@@ -40,19 +60,28 @@ export async function POST(req: Request) {
         contextPrompt = "User has not selected a country. Politely ask them to click a country on the globe first. Keep it very short.";
     }
 
-    const result = await model.generateContent({
-      contents: [
-        {
-          role: "user",
-          parts: [
-            { text: `System Context: ${contextPrompt}` },
-            { text: `User Question: ${message}` }
-          ]
-        }
-      ]
-    });
-    
-    const response = result.response.text();
+    // Identical questions (same country, same text) that arrive while one is being answered share its result
+    const question = String(message).trim();
+    const requestKey = `${countryData?.countryCode ?? ""}|${question}`;
+    let pending = inflightRequests.get(requestKey);
+    if (!pending) {
+      pending = model.generateContent({
+        contents: [
+          {
+            role: "user",
+            parts: [
+              { text: `System Context: ${contextPrompt}` },
+              { text: `User Question: ${question}` }
+            ]
+          }
+        ]
+      })
+        .then((result) => result.response.text())
+        .finally(() => inflightRequests.delete(requestKey));
+      inflightRequests.set(requestKey, pending);
+    }
+
+    const response = await pending;
     return NextResponse.json({ response });
 
   } catch (error: any) {
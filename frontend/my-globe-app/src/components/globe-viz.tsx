@@ -137,14 +137,25 @@ const GlobeViz = ({ onCountryClick, selectedCountryCode, isIntro }: GlobeVizProp
   const getPolygonSideColor = useCallback(() => "rgba(50, 50, 80, 0.4)", [])
   const getPolygonStrokeColor = useCallback(() => "#334155", [])
 
+  // Country names are lowercased once per GeoJSON load, not on every keystroke
+  const searchIndex = useMemo(
+    () => countries.features.map((feature) => ({ feature, name: feature.properties.ADMIN.toLowerCase() })),
+    [countries],
+  )
+
   const filteredCountries = useMemo(() => {
     if (!searchQuery) return []
-    return countries.features
-      .filter((feature) => 
-        feature.properties.ADMIN.toLowerCase().includes(searchQuery.toLowerCase())
-      )
-      .slice(0, 5) 
-  }, [countries, searchQuery])
+    const query = searchQuery.toLowerCase()
+    const matches: CountryFeature[] = []
+    for (const entry of searchIndex) {
+      if (entry.name.includes(query)) {
+        matches.push(entry.feature)
+        // Only five suggestions are shown, so stop scanning once they are found
+        if (matches.length === 5) break
+      }
+    }
+    return matches
+  }, [searchIndex, searchQuery])
 
 
   if (!GlobeComponent) {